@@ -7,11 +7,6 @@ from __future__ import print_function
 
 import sys
 import os
-import string
-import tempfile
-import subprocess
-import shutil
-import importlib
 
 from lib.clewn import __version__
 
@@ -35,30 +30,52 @@ endfunction
 
 def keymap_files():
     """Update the key map files for each debugger."""
+    import string
+    import importlib
+
     with open('runtime/macros/.pyclewn_keys.template') as tf:
         print('Updating:')
-        template = tf.read()
-        for d in DEBUGGERS:
-            filename = 'runtime/macros/.pyclewn_keys.%s' % d
-            try:
-                module = importlib.import_module('.%s' % d, 'lib.clewn')
-            except ImportError:
-                print('Warning: cannot update %s' % filename, file=sys.stderr)
-                continue
-            with open(filename, 'w') as f:
-                f.write(string.Template(template).substitute(clazz=d))
-                mapkeys = getattr(module, 'MAPKEYS')
-                for k in sorted(mapkeys):
-                    if len(mapkeys[k]) == 2:
-                        comment = ' # ' + mapkeys[k][1]
-                        f.write('# %s%s\n' % (('%s : %s' %
-                                (k, mapkeys[k][0])).ljust(30), comment))
-                    else:
-                        f.write('# %s : %s\n' % (k, mapkeys[k][0]))
-            print('  %s' % filename)
-
-def vimball():
-    """Build the vimball."""
+        template = string.Template(tf.read())
+    for d in DEBUGGERS:
+        filename = 'runtime/macros/.pyclewn_keys.%s' % d
+        try:
+            module = importlib.import_module('.%s' % d, 'lib.clewn')
+        except ImportError:
+            print('Warning: cannot update %s' % filename, file=sys.stderr)
+            continue
+        parts = [template.substitute(clazz=d)]
+        mapkeys = getattr(module, 'MAPKEYS')
+        for k, value in sorted(mapkeys.items()):
+            if len(value) == 2:
+                comment = ' # ' + value[1]
+                parts.append('# %s%s\n' % (('%s : %s' %
+                             (k, value[0])).ljust(30), comment))
+            else:
+                parts.append('# %s : %s\n' % (k, value[0]))
+        with open(filename, 'w') as f:
+            f.write(''.join(parts))
+        print('  %s' % filename)
+
+def hg_id():
+    """Start the process that prints the mercurial changeset id."""
+    import subprocess
+
+    return subprocess.Popen(['hg',  'id',  '-i'], stdout=subprocess.PIPE,
+                            universal_newlines=True)
+
+def vimball(hg_proc=None):
+    """Build the vimball.
+
+    'hg_proc' is the process started by hg_id(), it is started here when
+    None.
+
+    """
+    import tempfile
+    import subprocess
+    import shutil
+
+    if hg_proc is None:
+        hg_proc = hg_id()
     fd, tmpname = tempfile.mkstemp(prefix='vimball', suffix='.clewn')
     args = ['vim', '-u', 'NORC', '-vN',
             '-c', 'edit %s' % tmpname,
@@ -66,22 +83,22 @@ def vimball():
             '-c', 'quit',
            ]
 
-    # Create version.vim.
-    version = __version__ + '.' + subprocess.check_output(
-                    ['hg',  'id',  '-i'], universal_newlines=True)
-    with open('runtime/autoload/pyclewn/version.vim', 'w') as f:
-        f.write(VERSION_FUNC % version.rstrip('+\n'))
-
     data_dir = 'lib/clewn/runtime'
     if not os.path.exists(data_dir):
         os.mkdir(data_dir)
     # Remove the existing vimballs.
-    for dirpath, dirnames, filenames in os.walk(data_dir):
-        if dirpath == data_dir:
-            for fname in filenames:
-                if fname.startswith('pyclewn-') and fname.endswith('.vmb'):
-                    print('Removing', fname)
-                    os.unlink(os.path.join(dirpath, fname))
+    for fname in os.listdir(data_dir):
+        if fname.startswith('pyclewn-') and fname.endswith('.vmb'):
+            print('Removing', fname)
+            os.unlink(os.path.join(data_dir, fname))
+
+    # Create version.vim.
+    changeset = hg_proc.communicate()[0]
+    if hg_proc.returncode:
+        raise subprocess.CalledProcessError(hg_proc.returncode, 'hg id -i')
+    version = __version__ + '.' + changeset
+    with open('runtime/autoload/pyclewn/version.vim', 'w') as f:
+        f.write(VERSION_FUNC % version.rstrip('+\n'))
 
     # Build the vimball.
     try:
@@ -100,8 +117,15 @@ def vimball():
     shutil.move('runtime/pyclewn.vmb', vimball)
 
 def main():
-    keymap_files()
-    vimball()
+    # Run 'hg id' while the key map files are updated.
+    hg_proc = hg_id()
+    try:
+        keymap_files()
+        vimball(hg_proc)
+    finally:
+        # Reap the process when vimball() has not read its output.
+        if hg_proc.returncode is None:
+            hg_proc.communicate()
 
 if __name__ == '__main__':
         main()
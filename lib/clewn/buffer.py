@@ -10,36 +10,85 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import os
-import re
 
 from . import text_type, misc
 
 FRAME_ANNO_ID = 'frame'
 
-RE_CLEWNAME = r'^\s*(?P<path>.*)\(clewn\)_\w+$'     \
-              r'# RE: a valid ClewnBuffer name'
-
-# compile regexps
-re_clewname = re.compile(RE_CLEWNAME, re.VERBOSE)
+# The netbeans commands.
+CMD_EDIT = 'editFile'
+CMD_PUTBUF = 'putBufferNumber'
+CMD_STOP = 'stopDocumentListen'
+CMD_ADDANNO = 'addAnno'
+CMD_DEFANNO = 'defineAnnoType'
+CMD_REMANNO = 'removeAnno'
+CMD_SETDOT = 'setDot'
+
+# Number of slots of (enabled, disabled) breakpoint annotation types. The
+# sign text is the last two digits of the breakpoint number: breakpoints
+# below 100 use the slot of their number and the other ones the slot
+# '100 + bp % 100' whose text is zero padded. Breakpoint numbers start at one
+# and slot 0 is not used, its typeName "0" is the one of the frame
+# annotation.
+BP_POOL_SIZE = 200
+
+# The (enabled, disabled) defineAnnoType arguments of the breakpoint
+# annotation types without the background color, indexed by slot. The
+# typeNames of a slot are '2 * slot' and '2 * slot + 1'.
+BP_ANNO_TYPES = [None] + [
+        ('0 "%d" "" "%s" none ' % ((2 * slot), str(slot)[-2:]),
+         '0 "%d" "" "%s" none ' % ((2 * slot + 1), str(slot)[-2:]))
+        for slot in range(1, BP_POOL_SIZE)]
+
+def bp_slot(bp):
+    """Return the slot of the breakpoint annotation types of bp."""
+    if bp < 100:
+        return bp
+    return 100 + bp % 100
+
+# Maximum number of is_clewnbuf() results kept in _clewnbuf_cache.
+CLEWNBUF_CACHE_SIZE = 4096
+
+# A valid ClewnBuffer name is '[path](clewn)_name' where name is made of
+# alphanumeric characters and underscores.
+CLEWN_TAG = '(clewn)_'
 
 # set the logging methods
 (critical, error, warning, info, debug) = misc.logmethods('buf')
 
+# The is_clewnbuf() results keyed by buffer name.
+_clewnbuf_cache = {}
+
 def is_clewnbuf(bufname):
     """Return True if bufname is the name of a clewn buffer."""
-    matchobj = re_clewname.match(bufname)
-    if matchobj:
-        path = matchobj.group('path')
-        if not path or os.path.exists(path):
-            return True
-    return False
-
-class Buffer(dict):
-    """A Vim buffer is a dictionary of annotations {anno_id: annotation}.
+    try:
+        return _clewnbuf_cache[bufname]
+    except KeyError:
+        pass
+    result = False
+    idx = bufname.rfind(CLEWN_TAG)
+    if idx >= 0:
+        name = bufname[idx + len(CLEWN_TAG):]
+        # Underscores are valid in the name.
+        if name.replace('_', 'a').isalnum():
+            path = bufname[:idx].lstrip()
+            if not path or ('\x00' not in path and os.path.exists(path)):
+                result = True
+    if len(_clewnbuf_cache) >= CLEWNBUF_CACHE_SIZE:
+        _clewnbuf_cache.clear()
+    _clewnbuf_cache[bufname] = result
+    return result
+
+class Buffer(object):
+    """A Vim buffer and its annotations.
 
     Instance attributes:
         name: readonly property
             full pathname
+        _quoted_name: str
+            the quoted full pathname used in netbeans commands
+        annos: dictionary
+            the buffer annotations {anno_id: annotation}
         buf_id: int
             netbeans buffer number, starting at one
         nbsock: netbeans.Netbeans
@@ -52,15 +101,22 @@ class Buffer(dict):
             cursor line number
         col: int
             cursor column
-        last_typeNum: int
-            index+1 in vim netbeans.c signmap array
         frame_typeNum: int
             index+1 of the frame sign in vim netbeans.c signmap array
+        typeNum_pool: dictionary
+            the (enabled, disabled) typeNum pairs of the breakpoint
+            annotations defined in this buffer {slot: pair}
 
     """
 
+    __slots__ = ('__name', '_quoted_name', 'annos', 'buf_id', 'nbsock',
+                 'registered', 'editport', 'lnum', 'col', '__last_typeNum',
+                 'frame_typeNum', 'typeNum_pool')
+
     def __init__(self, name, buf_id, nbsock):
         self.__name = name
+        self._quoted_name = misc.quote(name)
+        self.annos = {}
         self.buf_id = buf_id
         self.nbsock = nbsock
         self.registered = False
@@ -69,58 +125,81 @@ class Buffer(dict):
         self.col = None
         self.__last_typeNum = 0
         self.frame_typeNum = 0
+        self.typeNum_pool = {}
 
-    # readonly property
-    def get_typeNum(self):
-        """Return a unique typeNum."""
+    def next_typeNum(self):
+        """Return a unique typeNum, index+1 in vim netbeans.c signmap array."""
         self.__last_typeNum += 1
         return self.__last_typeNum
 
-    last_typeNum = property(get_typeNum, None, None,
-                                'last annotation serial number')
-
-    def define_frameanno(self):
+    def define_frameanno(self, cmds):
         """Define the frame annotation."""
         if self.frame_typeNum == 0:
-            self.frame_typeNum = self.last_typeNum
-            self.nbsock.send_cmd(self, 'defineAnnoType',
-                '0 "0" "" "=>" none %s' % self.nbsock.bg_colors[2])
+            self.frame_typeNum = self.next_typeNum()
+            cmds.append((CMD_DEFANNO,
+                '0 "0" "" "=>" none %s' % self.nbsock.bg_colors[2]))
+
+    def define_bpannos(self, slot, cmds):
+        """Define the breakpoint annotations of slot when not yet defined.
+
+        Return the (enabled, disabled) typeNum pair of the slot.
+
+        """
+        typeNums = self.typeNum_pool.get(slot)
+        if typeNums is None:
+            enabled_color, disabled_color = self.nbsock.bg_colors[:2]
+            enabled_args, disabled_args = BP_ANNO_TYPES[slot]
+            typeNums = (self.next_typeNum(), self.next_typeNum())
+            self.typeNum_pool[slot] = typeNums
+            cmds.append((CMD_DEFANNO, enabled_args + enabled_color))
+            cmds.append((CMD_DEFANNO, disabled_args + disabled_color))
+        return typeNums
 
     def add_anno(self, anno_id, lnum):
         """Add an annotation."""
-        if anno_id not in self.keys():
+        annos = self.annos
+        if anno_id not in annos:
             if anno_id == FRAME_ANNO_ID:
                 frame = self.nbsock.frame_annotation
                 frame.set_buf_lnum(self, lnum)
-                self[anno_id] = frame
+                annos[anno_id] = frame
             else:
-                self[anno_id] = Annotation(self, anno_id, lnum, self.nbsock)
+                annos[anno_id] = Annotation(self, anno_id, lnum, self.nbsock)
         else:
-            self[anno_id].lnum = lnum
+            annos[anno_id].lnum = lnum
         self.update(anno_id)
 
     def delete_anno(self, anno_id):
         """Delete an annotation."""
-        assert anno_id in self.keys()
-        self[anno_id].remove_anno()
-        if anno_id == FRAME_ANNO_ID:
-            del self[anno_id]
+        self.delete_annos([anno_id])
+
+    def delete_annos(self, anno_ids):
+        """Delete a list of annotations with a single write."""
+        cmds = []
+        for anno_id in anno_ids:
+            assert anno_id in self.annos
+            self.annos[anno_id].remove_anno(cmds)
+            if anno_id == FRAME_ANNO_ID:
+                del self.annos[anno_id]
+        self.nbsock.send_cmds(self, cmds)
 
     def update(self, anno_id=None, disabled=False):
         """Update the buffer with netbeans."""
+        cmds = []
         # open file in netbeans
         if not self.registered:
-            self.nbsock.send_cmd(self, 'editFile', misc.quote(self.name))
-            self.nbsock.send_cmd(self, 'putBufferNumber', misc.quote(self.name))
-            self.nbsock.send_cmd(self, 'stopDocumentListen')
+            cmds.append((CMD_EDIT, self._quoted_name))
+            cmds.append((CMD_PUTBUF, self._quoted_name))
+            cmds.append((CMD_STOP, ''))
             self.registered = True
 
         # update annotations
         if anno_id:
-            self[anno_id].update(disabled)
+            self.annos[anno_id].update(disabled, cmds)
         else:
-            for anno_id in self.keys():
-                self[anno_id].update()
+            for anno in self.annos.values():
+                anno.update(cmds=cmds)
+        self.nbsock.send_cmds(self, cmds)
 
     def remove_all(self, lnum=None):
         """Remove all netbeans annotations at line lnum.
@@ -128,9 +207,13 @@ class Buffer(dict):
         When lnum is None, remove all annotations.
 
         """
-        for anno_id in self.keys():
-            if lnum is None or self[anno_id].lnum == lnum:
-                self[anno_id].remove_anno()
+        annos = [anno for anno in self.annos.values()
+                    if anno.is_set and (lnum is None or anno.lnum == lnum)]
+        if self.registered:
+            self.nbsock.send_cmd_batch(self, CMD_REMANNO,
+                                       [str(anno.sernum) for anno in annos])
+        for anno in annos:
+            anno.is_set = False
 
     # readonly property
     def getname(self):
@@ -138,6 +221,10 @@ class Buffer(dict):
         return self.__name
     name = property(getname, None, None, getname.__doc__)
 
+    def __repr__(self):
+        """Return the annotations representation."""
+        return repr(self.annos)
+
 class Annotation(object):
     """A netbeans annotation.
 
@@ -157,8 +244,9 @@ class Annotation(object):
             used to be able to remove it
         is_set: boolean
             True when annotation has been added with netbeans
-        defined: boolean
-            True after completion of the defineAnnoType netbeans command
+        addanno_prefix: tuple
+            the (enabled, disabled) 'sernum typeNum ' prefixes of the addAnno
+            arguments, None until the annotation types are defined
 
     """
 
@@ -170,51 +258,56 @@ class Annotation(object):
         self.disabled = disabled
         self.enabled_sernum = self.sernum = nbsock.sernum.last
         self.disabled_sernum  = nbsock.sernum.last
-
-        self.enabled_typeNum = buf.last_typeNum
-        self.disabled_typeNum = buf.last_typeNum
         self.is_set = False
-        self.defined = False
-
-    def define_bpanno(self):
-        """Define the two annotations for breakpoints."""
-        if not self.defined:
-            self.defined = True
-            self.nbsock.send_cmd(self.buf, 'defineAnnoType',
-                '0 "%d" "" "%s" none %s'
-                % ((2 * self.bp), str(self.bp)[-2:],
-                   self.nbsock.bg_colors[0]))
-            self.nbsock.send_cmd(self.buf, "defineAnnoType",
-                '0 "%d" "" "%s" none %s'
-                % ((2 * self.bp + 1), str(self.bp)[-2:],
-                   self.nbsock.bg_colors[1]))
-
-    def update(self, disabled=False):
-        """Update the annotation."""
+        self.addanno_prefix = None
+
+    def update(self, disabled=False, cmds=None):
+        """Update the annotation.
+
+        The netbeans commands are appended to the 'cmds' list when not None,
+        otherwise they are sent to Vim in a single write.
+
+        """
+        pending = [] if cmds is None else cmds
         if self.disabled != disabled:
-            self.remove_anno()
+            self.remove_anno(pending)
             self.disabled = disabled
         if not self.is_set:
-            self.define_bpanno()
+            if self.addanno_prefix is None:
+                enabled_typeNum, disabled_typeNum =                     \
+                            self.buf.define_bpannos(bp_slot(self.bp), pending)
+                self.addanno_prefix = (
+                        '%d %d ' % (self.enabled_sernum, enabled_typeNum),
+                        '%d %d ' % (self.disabled_sernum, disabled_typeNum))
             if self.disabled:
                 self.sernum = self.disabled_sernum
-                typeNum = self.disabled_typeNum
+                prefix = self.addanno_prefix[1]
             else:
                 self.sernum = self.enabled_sernum
-                typeNum = self.enabled_typeNum
-            self.nbsock.send_cmd(self.buf, 'addAnno', '%d %d %d/0 -1'
-                                    % (self.sernum, typeNum, self.lnum))
+                prefix = self.addanno_prefix[0]
+            pos = '%d/0' % self.lnum
+            pending.append((CMD_ADDANNO, prefix + pos + ' -1'))
             self.nbsock.last_buf = self.buf
             self.nbsock.last_buf.lnum = self.lnum
             self.nbsock.last_buf.col = 0
 
-            self.nbsock.send_cmd(self.buf, 'setDot', '%d/0' % self.lnum)
+            pending.append((CMD_SETDOT, pos))
             self.is_set = True
+        if cmds is None:
+            self.nbsock.send_cmds(self.buf, pending)
+
+    def remove_anno(self, cmds=None):
+        """Remove the annotation.
+
+        The removeAnno netbeans command is appended to the 'cmds' list when
+        not None, otherwise it is sent to Vim.
 
-    def remove_anno(self):
-        """Remove the annotation."""
+        """
         if self.buf.registered and self.is_set:
-            self.nbsock.send_cmd(self.buf, 'removeAnno', str(self.sernum))
+            if cmds is None:
+                self.nbsock.send_cmd(self.buf, CMD_REMANNO, str(self.sernum))
+            else:
+                cmds.append((CMD_REMANNO, str(self.sernum)))
         self.is_set = False
 
     def __repr__(self):
@@ -241,33 +334,41 @@ class FrameAnnotation(Annotation):
         self.lnum = lnum
         self.is_set = False
 
-    def update(self, disabled=False):
+    def update(self, disabled=False, cmds=None):
         """Update the annotation."""
+        pending = [] if cmds is None else cmds
         if not self.is_set:
-            self.buf.define_frameanno()
-            self.nbsock.send_cmd(self.buf, 'addAnno', '%d %d %d/0 -1'
-                            % (self.sernum, self.buf.frame_typeNum, self.lnum))
+            self.buf.define_frameanno(pending)
+            pos = '%d/0' % self.lnum
+            pending.append((CMD_ADDANNO, '%d %d %s -1'
+                            % (self.sernum, self.buf.frame_typeNum, pos)))
             self.nbsock.last_buf = self.buf
             self.nbsock.last_buf.lnum = self.lnum
             self.nbsock.last_buf.col = 0
 
-            self.nbsock.send_cmd(self.buf, 'setDot', '%d/0' % self.lnum)
+            pending.append((CMD_SETDOT, pos))
             self.is_set = True
+        if cmds is None:
+            self.nbsock.send_cmds(self.buf, pending)
 
     def __repr__(self):
         """Return frame information."""
         return 'frame at line %d' % self.lnum
 
-class BufferSet(dict):
-    """The Vim buffer set is a dictionary of {pathname: Buffer instance}.
+class BufferSet(object):
+    """The Vim buffer set maps a pathname to a Buffer instance.
 
     Instance attributes:
         nbsock: netbeans.Netbeans
             the netbeans protocol
+        _bufs: dictionary
+            dictionary of {pathname: Buffer instance}
         buf_list: python list
             the list of Buffer instances indexed by netbeans 'bufID'
         anno_dict: dictionary
             global dictionary of all annotations {anno_id: Buffer instance}
+        _nonclewn_count: int
+            the number of non ClewnBuffer buffers
 
     A Buffer instance is never removed from BufferSet.
 
@@ -275,8 +376,10 @@ class BufferSet(dict):
 
     def __init__(self, nbsock):
         self.nbsock = nbsock
+        self._bufs = {}
         self.buf_list = []
         self.anno_dict = {}
+        self._nonclewn_count = 0
 
     def add_anno(self, anno_id, pathname, lnum):
         """Add the annotation to the global list and to the buffer annotation
@@ -292,18 +395,20 @@ class BufferSet(dict):
 
     def update_anno(self, anno_id, disabled=False):
         """Update the annotation."""
-        if anno_id not in self.anno_dict.keys():
+        buf = self.anno_dict.get(anno_id)
+        if buf is None:
             raise KeyError('"anno_id" does not exist:  %s' % anno_id)
-        self.anno_dict[anno_id].update(anno_id, disabled)
+        buf.update(anno_id, disabled)
 
     def delete_anno(self, anno_id):
         """Delete the annotation from the global list and from the buffer
         annotation list.
 
         """
-        if anno_id not in self.anno_dict.keys():
+        buf = self.anno_dict.get(anno_id)
+        if buf is None:
             raise KeyError('"anno_id" does not exist:  %s' % anno_id)
-        self.anno_dict[anno_id].delete_anno(anno_id)
+        buf.delete_anno(anno_id)
         del self.anno_dict[anno_id]
 
     def show_frame(self, pathname=None, lnum=1):
@@ -315,7 +420,7 @@ class BufferSet(dict):
         """
         if not isinstance(lnum, int) or lnum <= 0:
             raise ValueError('"lnum" must be strictly positive: %s' % lnum)
-        if FRAME_ANNO_ID in self.anno_dict.keys():
+        if FRAME_ANNO_ID in self.anno_dict:
             self.delete_anno(FRAME_ANNO_ID)
         if pathname:
             self.add_anno(FRAME_ANNO_ID, pathname, lnum)
@@ -332,12 +437,12 @@ class BufferSet(dict):
         Return True when successful.
 
         """
-        if bp_id in self.anno_dict.keys():
-            self.update_anno(bp_id, disabled)
-            return True
-        else:
+        buf = self.anno_dict.get(bp_id)
+        if buf is None:
             error('attempt to update an unknown annotation')
             return False
+        buf.update(bp_id, disabled)
+        return True
 
     def getbuf(self, buf_id):
         """Return the Buffer at idx in list."""
@@ -350,11 +455,17 @@ class BufferSet(dict):
         """Remove all annotations.
 
         Vim signs are unplaced.
-        Annotations are not deleted.
+        Annotations are removed from the global list, the breakpoint
+        annotations are not deleted from their buffer.
 
         """
-        for anno_id in list(self.anno_dict.keys()):
-            self.delete_anno(anno_id)
+        # Delete the annotations of a buffer in a single write.
+        buf_annos = {}
+        for anno_id, buf in self.anno_dict.items():
+            buf_annos.setdefault(buf, []).append(anno_id)
+        for buf, anno_ids in buf_annos.items():
+            buf.delete_annos(anno_ids)
+        self.anno_dict.clear()
 
     def get_lnum_list(self, pathname):
         """Return the list of line numbers of all enabled breakpoints.
@@ -362,15 +473,14 @@ class BufferSet(dict):
         A line number may be duplicated in the list.
 
         """
-        lnum_list = []
-        if pathname in self:
-            lnum_list = [anno.lnum for anno in self[pathname].values()
-                        if not anno.disabled
-                        and not isinstance(anno, FrameAnnotation)]
-        return lnum_list
+        buf = self._bufs.get(pathname)
+        if buf is None:
+            return []
+        return [anno.lnum for anno_id, anno in buf.annos.items()
+                    if anno_id != FRAME_ANNO_ID and not anno.disabled]
 
     #-----------------------------------------------------------------------
-    #   Dictionary methods
+    #   Mapping methods
     #-----------------------------------------------------------------------
     def __getitem__(self, pathname):
         """Get Buffer with pathname as key, instantiate one when not found.
@@ -378,47 +488,41 @@ class BufferSet(dict):
         The pathname parameter must be an absolute path name.
 
         """
+        # The pathname has been validated when the Buffer was inserted.
+        buf = self._bufs.get(pathname)
+        if buf is not None:
+            return buf
+
         if not isinstance(pathname, text_type)    \
                 or (not os.path.isabs(pathname)   \
                     and not is_clewnbuf(pathname)):
             raise ValueError(
                 '"pathname" is not an absolute path: %s' % pathname)
-        if not pathname in self:
-            # netbeans buffer numbers start at one
-            buf = Buffer(pathname, len(self.buf_list) + 1, self.nbsock)
-            self.buf_list.append(buf)
-            dict.__setitem__(self, pathname, buf)
-        return dict.__getitem__(self, pathname)
+        # netbeans buffer numbers start at one
+        buf = Buffer(pathname, len(self.buf_list) + 1, self.nbsock)
+        self.buf_list.append(buf)
+        self._bufs[pathname] = buf
+        if not is_clewnbuf(pathname):
+            self._nonclewn_count += 1
+        return buf
 
     def __setitem__(self, pathname, item):
         """Mapped to __getitem__."""
         self.__getitem__(pathname)
 
-    def setdefault(self, pathname, failobj=None):
-        """Mapped to __getitem__."""
-        return self.__getitem__(pathname)
+    def __contains__(self, pathname):
+        """Return True if there is a Buffer with pathname as key."""
+        return pathname in self._bufs
 
-    def __delitem__(self, key):
-        """A key is never removed."""
-        pass
+    def __iter__(self):
+        """Iterate over the pathnames."""
+        return iter(self._bufs)
 
     def __len__(self):
         """Return the number of non ClewnBuffer buffers."""
-        return len([p for p in self if not is_clewnbuf(p)])
-
-    def popitem(self):
-        """A key is never removed."""
-        pass
+        return self._nonclewn_count
 
-    def pop(self, key, *args):
-        """A key is never removed."""
-        pass
-
-    def update(self, dict=None, **kwargs):
-        """Not implemented."""
-        assert False, 'not implemented'
-
-    def copy(self):
-        """Not implemented."""
-        assert False, 'not implemented'
+    def __repr__(self):
+        """Return the buffers representation."""
+        return repr(self._bufs)
 
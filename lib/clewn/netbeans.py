@@ -218,7 +218,8 @@ class ClewnBuffer(object):
 
     def register(self):
         """Register the buffer with netbeans vim."""
-        self.nbsock.send_cmd(self.buf, 'editFile', misc.quote(self.buf.name))
+        self.nbsock.send_cmd(self.buf, vimbuffer.CMD_EDIT,
+                                            misc.quote(self.buf.name))
         self.nbsock.send_cmd(self.buf, 'setReadOnly', 'T')
         self.buf.registered = True
 
@@ -235,9 +236,11 @@ class ClewnBuffer(object):
         """Set the cursor at the requested position."""
         if self.visible:
             if offset is not None:
-                self.nbsock.send_cmd(self.buf, 'setDot', str(offset))
+                self.nbsock.send_cmd(self.buf, vimbuffer.CMD_SETDOT,
+                                                            str(offset))
             else:
-                self.nbsock.send_cmd(self.buf, 'setDot', '%d/0' % lnum)
+                self.nbsock.send_cmd(self.buf, vimbuffer.CMD_SETDOT,
+                                                            '%d/0' % lnum)
 
     def terminate_editing(self, goto_last=True):
         """Terminate editing a ClewnBuffer."""
@@ -840,7 +843,7 @@ class Netbeans(asyncio.Protocol, object):
         if (self.debugger.vim.options.window != 'usetab' or
                 not ClewnBuffer.clewn_tabpage or self.got_addAnno):
             if self.last_buf is not None:
-                self.send_cmd(self.last_buf, 'setDot', '%d/%d' %
+                self.send_cmd(self.last_buf, vimbuffer.CMD_SETDOT, '%d/%d' %
                                     (self.last_buf.lnum, self.last_buf.col))
 
     #-----------------------------------------------------------------------
@@ -872,9 +875,9 @@ class Netbeans(asyncio.Protocol, object):
                 if buf.buf_id != buf_id:
                     if buf_id == 0:
                         if not buf.registered:
-                            self.send_cmd(buf, 'putBufferNumber',
+                            self.send_cmd(buf, vimbuffer.CMD_PUTBUF,
                                                     misc.quote(pathname))
-                            self.send_cmd(buf, 'stopDocumentListen')
+                            self.send_cmd(buf, vimbuffer.CMD_STOP)
                             buf.registered = True
                         buf.update()
                     else:
@@ -1000,10 +1003,25 @@ class Netbeans(asyncio.Protocol, object):
 
     def send_cmd(self, buf, cmd, args=''):
         """Send a command to Vim."""
-        if cmd == 'addAnno':
+        if cmd == vimbuffer.CMD_ADDANNO:
             self.got_addAnno = True
         self.send_request('%d:%s!%d%s%s\n', buf, cmd, args)
 
+    def send_cmds(self, buf, cmds):
+        """Send a list of (cmd, args) commands to Vim in a single write."""
+        msgs = []
+        for cmd, args in cmds:
+            if cmd == vimbuffer.CMD_ADDANNO:
+                self.got_addAnno = True
+            msgs.append(self.format_request('%d:%s!%d%s%s\n',
+                                            buf, cmd, args))
+        if msgs:
+            self.push_request(''.join(msgs))
+
+    def send_cmd_batch(self, buf, cmd, args_list):
+        """Send the same command to Vim for each args in a single write."""
+        self.send_cmds(buf, [(cmd, args) for args in args_list])
+
     def send_function(self, buf, function, args=''):
         """Send a function call to Vim."""
         # race condition: queue the pending reply first, before the
@@ -1031,6 +1049,10 @@ class Netbeans(asyncio.Protocol, object):
 
     def send_request(self, fmt, buf, request, args):
         """Send a netbeans function or command."""
+        self.push_request(self.format_request(fmt, buf, request, args))
+
+    def format_request(self, fmt, buf, request, args):
+        """Return a netbeans function or command message."""
         self.seqno += 1
         buf_id = 0
         space = ' '
@@ -1040,7 +1062,10 @@ class Netbeans(asyncio.Protocol, object):
             space = ''
         msg = fmt % (buf_id, request, self.seqno, space, args)
         debug(msg.strip('\n'))
+        return msg
 
+    def push_request(self, msg):
+        """Push netbeans messages when connected."""
         if self.connected:
             self.push(msg)
         else:
@@ -316,3 +316,18 @@ class Simple(ClewnTestCase):
             )
         self.cltest_redir(cmd, expected)
 
+    def test_016(self):
+        """The frame and a breakpoint signs in the same buffer"""
+        cmd = [
+            'edit ${test_file}1',
+            'Cbreak ${test_file}1:1',
+            'Cstep',
+            'redir! > ${test_out}',
+            'sign place',
+            'qa!',
+            ]
+        expected = (
+            'line=1  id=1  name=3',
+            'line=1  id=2  name=1',
+            )
+        self.cltest_redir(cmd, expected, 'line 1\nline 2\n')